@@ -1,4 +1,20 @@
 # -*- mode: python ; coding: utf-8 -*-
+# Build with build_fandom_ai.py, or directly:
+#   pyinstaller FandomAI.spec                     single-file executable
+#   pyinstaller FandomAI.spec -- --fast-startup   onedir bundle, starts without unpacking to a temp dir
+import argparse
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--fast-startup", action="store_true")
+options = parser.parse_args()
+
+# Modules the GUI never imports but that get pulled in from the environment
+# (requirements.txt installs torch/transformers for the command-line fandom_ai.py)
+EXCLUDES = [
+    'torch', 'transformers', 'tokenizers', 'safetensors', 'huggingface_hub',
+    'tensorflow', 'numpy', 'pandas', 'scipy', 'sympy', 'sklearn',
+    'matplotlib', 'PIL', 'lxml', 'IPython', 'pytest',
+]
 
 
 a = Analysis(
@@ -10,29 +26,57 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    excludes=EXCLUDES,
     noarchive=False,
     optimize=0,
 )
 pyz = PYZ(a.pure)
 
-exe = EXE(
-    pyz,
-    a.scripts,
-    a.binaries,
-    a.datas,
-    [],
-    name='FandomAI',
-    debug=False,
-    bootloader_ignore_signals=False,
-    strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
-    console=False,
-    disable_windowed_traceback=False,
-    argv_emulation=False,
-    target_arch=None,
-    codesign_identity=None,
-    entitlements_file=None,
-)
+if options.fast_startup:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        [],
+        exclude_binaries=True,
+        name='FandomAI',
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=False,
+        upx=True,
+        console=False,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+    )
+    coll = COLLECT(
+        exe,
+        a.binaries,
+        a.datas,
+        strip=False,
+        upx=True,
+        upx_exclude=[],
+        name='FandomAI',
+    )
+else:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        a.binaries,
+        a.datas,
+        [],
+        name='FandomAI',
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=False,
+        upx=True,
+        upx_exclude=[],
+        runtime_tmpdir=None,
+        console=False,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+    )
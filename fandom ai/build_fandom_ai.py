@@ -1,29 +1,46 @@
 import subprocess
 import sys
 import os
+import argparse
 
-# Path to the main script
-SCRIPT = "fandom_ai_gui.py"
+# Spec file with the exclusion list and both build variants
+SPEC = "FandomAI.spec"
 EXE_NAME = "FandomAI"
 
+parser = argparse.ArgumentParser(description="Build the FandomAI executable.")
+parser.add_argument("--fast-startup", action="store_true",
+                    help="build a onedir bundle that starts without unpacking to a temp dir, and report launch time")
+parser.add_argument("--cold", action="store_true",
+                    help="with --fast-startup, clear the OS file cache before the first timed launch (needs root/sudo)")
+args = parser.parse_args()
+
 # Ensure PyInstaller is installed
 try:
     import PyInstaller
 except ImportError:
     print("Installing PyInstaller...")
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "pyinstaller"])
+    subprocess.check_call([sys.executable, "-m", "pip", "install", "pyinstaller>=6"])
 
-# Build the EXE
-cmd = [
-    sys.executable, "-m", "PyInstaller",
-    "--noconfirm", "--onefile", "--windowed",
-    f"--name={EXE_NAME}", SCRIPT
-]
+# Build the EXE (arguments after "--" are passed to the spec file)
+cmd = [sys.executable, "-m", "PyInstaller", "--noconfirm", SPEC]
+if args.fast_startup:
+    cmd += ["--", "--fast-startup"]
 print("Building the EXE...")
 subprocess.check_call(cmd)
 
-# Open the output folder
 output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dist")
+
+# Measure first/cold and warm launch time of the fresh build (failed launches are reported, not raised)
+if args.fast_startup:
+    import measure_startup
+    exe = EXE_NAME + (".exe" if sys.platform == "win32" else "")
+    target = [os.path.join(output_dir, EXE_NAME, exe)]
+    report = measure_startup.format_report(target, measure_startup.measure(target, cold=args.cold))
+    print(report)
+    with open(os.path.join(output_dir, "startup_report.txt"), "w", encoding="utf-8") as f:
+        f.write(report + "\n")
+
+# Open the output folder
 if os.path.exists(output_dir):
     if sys.platform == "win32":
         os.startfile(output_dir)
@@ -1,14 +1,13 @@
 import tkinter as tk
 from tkinter import scrolledtext, messagebox, ttk
 import threading
-import requests
-from bs4 import BeautifulSoup
 import re
 from urllib.parse import urlparse
 import os
 import json
-import openai
 import pathlib
+import time
+from collections import OrderedDict
 
 # Built-in fandoms for quick selection
 FANDOMS = {
@@ -28,6 +27,7 @@ class Settings:
 settings = Settings()
 
 CONFIG_PATH = os.path.join(pathlib.Path.home(), "fandom_ai_config.json")
+PAGE_CACHE_SIZE = 20
 
 # --- Config management ---
 def load_config():
@@ -46,45 +46,66 @@ def save_config(config):
     except Exception:
         pass
 
+def _soup(html):
+    # bs4 is imported on first use so it does not slow down startup
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, 'html.parser')
+
 def get_all_fandom_pages(base_url):
     parsed = urlparse(base_url)
     root = f"{parsed.scheme}://{parsed.netloc}"
     allpages_url = root + "/wiki/Special:AllPages"
+    import requests
     resp = requests.get(allpages_url)
     if resp.status_code != 200:
         return []
-    soup = BeautifulSoup(resp.text, 'html.parser')
+    soup = _soup(resp.text)
     links = soup.select('ul.mw-allpages-chunk li a')
     return [root + link['href'] for link in links if link.has_attr('href')]
 
-def fetch_fandom_page(url):
+def fetch_page_html(url):
+    # requests is imported on first use so it does not slow down startup
+    import requests
     resp = requests.get(url)
     if resp.status_code != 200:
         return None
-    soup = BeautifulSoup(resp.text, 'html.parser')
+    return resp.text
+
+def page_text_from_html(html):
+    soup = _soup(html)
     content = soup.find('div', {'class': 'mw-parser-output'})
     if not content:
         return None
     return content.get_text(separator=' ', strip=True)
 
-def scan_all_pages(base_url, search_term, output_box):
-    output_box.insert(tk.END, f"\nScanning all pages for '{search_term}'...\n")
-    pages = get_all_fandom_pages(base_url)
-    best_match = None
+def fetch_fandom_page(url):
+    html = fetch_page_html(url)
+    if not html:
+        return None
+    return page_text_from_html(html)
+
+def find_best_page(base_url, search_term, fetch=fetch_fandom_page):
+    """Return (url, text) of the page that mentions search_term most often, or (None, None)."""
+    best_url, best_text = None, None
     best_score = 0
-    for url in pages:
+    for url in get_all_fandom_pages(base_url):
         try:
-            text = fetch_fandom_page(url)
+            text = fetch(url)
             if not text:
                 continue
             score = text.lower().count(search_term.lower())
             if score > best_score:
                 best_score = score
-                best_match = (url, text[:500])
+                best_url, best_text = url, text
         except Exception:
             continue
-    if best_match:
-        output_box.insert(tk.END, f"Best match: {best_match[0]}\nPreview: {best_match[1]}...\n")
+    return best_url, best_text
+
+def scan_all_pages(base_url, search_term, output_box):
+    output_box.insert(tk.END, f"\nScanning all pages for '{search_term}'...\n")
+    best_url, best_text = find_best_page(base_url, search_term)
+    if best_url:
+        output_box.insert(tk.END, f"Best match: {best_url}\nPreview: {best_text[:500]}...\n")
     else:
         output_box.insert(tk.END, "No relevant article found.\n")
 
@@ -100,39 +121,316 @@ def list_sections(text, output_box):
         if re.match(r"^=+[^=]+=+$", line.strip()):
             output_box.insert(tk.END, f"- {line.strip().strip('=').strip()}\n")
 
-def list_links(url, output_box):
-    resp = requests.get(url)
-    soup = BeautifulSoup(resp.text, 'html.parser')
+def page_sections_from_html(html):
+    soup = _soup(html)
+    headlines = soup.select('div.mw-parser-output h2 .mw-headline, div.mw-parser-output h3 .mw-headline')
+    return [h.get_text(strip=True) for h in headlines]
+
+def page_links_from_html(html):
+    soup = _soup(html)
     links = soup.select('div.mw-parser-output a[href^="/wiki/"]')
+    return [link.get('href') for link in links]
+
+def parse_infobox(soup):
+    """Return the infobox as a list of (label, value) pairs, or None if the page has no infobox."""
+    infobox = soup.find('table', {'class': 'infobox'})
+    if infobox:
+        rows = []
+        for row in infobox.find_all('tr'):
+            th = row.find('th')
+            td = row.find('td')
+            if th and td:
+                rows.append((th.get_text(strip=True), td.get_text(strip=True)))
+        return rows
+    portable = soup.find('aside', {'class': 'portable-infobox'})
+    if portable:
+        rows = []
+        for item in portable.select('.pi-data'):
+            label = item.select_one('.pi-data-label')
+            value = item.select_one('.pi-data-value')
+            if label and value:
+                rows.append((label.get_text(strip=True), value.get_text(' ', strip=True)))
+        return rows
+    return None
+
+def infobox_rows_from_html(html):
+    return parse_infobox(_soup(html))
+
+# --- Structured page content for context packing ---
+BOILERPLATE_SELECTORS = ['script', 'style', 'table.navbox', 'div.navbox', 'div.toc', '#toc', '.mw-editsection',
+                         '.reference', '.references', '.noprint', 'table.infobox', 'aside.portable-infobox']
+
+BLOCK_TAGS = ['p', 'ul', 'ol', 'dl', 'table', 'blockquote']
+
+def _inside_block(el, content):
+    """True if el is nested in another block element, whose text already includes it."""
+    for parent in el.parents:
+        if parent is content:
+            return False
+        if parent.name in BLOCK_TAGS:
+            return True
+    return False
+
+def page_parts_from_html(html, url):
+    """Split a page into intro, infobox and (heading, paragraphs) sections, with boilerplate removed."""
+    soup = _soup(html)
+    content = soup.find('div', {'class': 'mw-parser-output'})
+    if not content:
+        return None
+    infobox = parse_infobox(content)
+    for selector in BOILERPLATE_SELECTORS:
+        for tag in content.select(selector):
+            tag.decompose()
+    intro, sections = [], []
+    paragraphs = intro
+    # Walk the whole tree: main pages and many articles wrap their content in layout divs
+    for el in content.find_all(['h2', 'h3'] + BLOCK_TAGS):
+        if _inside_block(el, content):
+            continue
+        if el.name in ('h2', 'h3'):
+            paragraphs = []
+            sections.append((el.get_text(strip=True), paragraphs))
+            continue
+        text = el.get_text(' ', strip=True)
+        if text:
+            paragraphs.append(text)
+    if not intro and not any(ps for _, ps in sections):
+        # No block elements at all (text sits directly in divs): use the plain page text
+        text = content.get_text(' ', strip=True)
+        intro = [text] if text else []
+        sections = []
+    return {"url": url, "infobox": infobox or [], "intro": intro, "sections": sections}
+
+def list_links(url, output_box):
+    html = fetch_page_html(url)
+    if not html:
+        output_box.insert(tk.END, "Could not load this page.\n")
+        return
     output_box.insert(tk.END, "Links on this page:\n")
-    for link in links:
-        output_box.insert(tk.END, f"- {link.get('href')}\n")
+    for href in page_links_from_html(html):
+        output_box.insert(tk.END, f"- {href}\n")
 
 def summarize_section(text, section, output_box):
     output_box.insert(tk.END, "Local AI is not available. Please use an API model.\n")
 
 def extract_infobox(url, output_box):
-    resp = requests.get(url)
-    soup = BeautifulSoup(resp.text, 'html.parser')
-    infobox = soup.find('table', {'class': 'infobox'})
-    if not infobox:
+    html = fetch_page_html(url)
+    if not html:
+        output_box.insert(tk.END, "Could not load this page.\n")
+        return
+    rows = infobox_rows_from_html(html)
+    if rows is None:
         output_box.insert(tk.END, "No infobox found on this page.\n")
         return
     output_box.insert(tk.END, "Infobox data:\n")
-    for row in infobox.find_all('tr'):
-        th = row.find('th')
-        td = row.find('td')
-        if th and td:
-            output_box.insert(tk.END, f"- {th.get_text(strip=True)}: {td.get_text(strip=True)}\n")
-
-def gpt35_turbo_chat(messages, api_key):
-    if not openai:
+    for label, value in rows:
+        output_box.insert(tk.END, f"- {label}: {value}\n")
+
+# --- Local intent classification and query planning ---
+GREETINGS = ["hi", "hello", "hey", "yo", "good morning", "good afternoon", "good evening"]
+FAREWELLS = ["bye", "goodbye", "see you", "see ya", "later", "cya"]
+THANKS = ["thanks", "thank you", "thx", "ty", "appreciate it"]
+SMALL_TALK_FILLER = {"there", "ai", "bot", "again", "so", "much", "a", "lot", "very", "you", "all", "then", "for", "now",
+                     "ok", "okay", "oh", "well", "great", "cool", "nice", "and", "guys", "man", "buddy"}
+QUESTION_WORDS = {"who", "what", "where", "when", "why", "how", "which", "whose", "whom", "is", "are", "does", "do", "can"}
+MAX_SEARCH_TERM_WORDS = 4
+SEARCH_NOISE_WORDS = {"the", "a", "an", "this", "that", "some", "any", "out"}
+
+def _matches_phrase(q, phrases):
+    return any(re.search(rf"\b{re.escape(p)}\b", q) for p in phrases)
+
+def _is_small_talk(q, phrases):
+    """True if the whole message is one of the phrases plus filler words, not a question that starts with one."""
+    q = " ".join(re.findall(r"[a-z']+", q))
+    if not _matches_phrase(q, phrases):
+        return False
+    rest = q
+    for p in sorted(phrases, key=len, reverse=True):
+        rest = re.sub(rf"\b{re.escape(p)}\b", " ", rest)
+    leftover = [w for w in rest.split() if w not in SMALL_TALK_FILLER]
+    return not leftover
+
+def _is_search_term(term):
+    """Only short noun phrases are searched for; 'find out who made X' is a question, not a page lookup."""
+    words = re.findall(r"[a-z0-9']+", term)
+    return (0 < len(words) <= MAX_SEARCH_TERM_WORDS and words[0] != "out"
+            and '?' not in term and not QUESTION_WORDS.intersection(words)
+            and not set(words) <= SEARCH_NOISE_WORDS)
+
+def classify_intent(query):
+    """Classify a chat message locally. Returns (intent, argument)."""
+    q = query.lower().strip()
+    if _is_small_talk(q, GREETINGS):
+        return "greeting", None
+    if _is_small_talk(q, FAREWELLS):
+        return "farewell", None
+    if _is_small_talk(q, THANKS):
+        return "thanks", None
+    match = (re.search(r"\bfind (the )?(?P<term>.+?) (page|article)\b", q)
+             or re.match(r"^(find|search for|look up|lookup)\s+(the )?(?P<term>.+?)[.!]*$", q))
+    if match and _is_search_term(match.group('term')):
+        return "find", match.group('term').strip()
+    if re.search(r"\binfo ?box\b", q):
+        return "infobox", None
+    if re.search(r"\b(list|show|what are)\b.*\b(sections|headings)\b", q):
+        return "list_sections", None
+    if re.search(r"\b(list|show|what are)\b.*\blinks\b", q):
+        return "list_links", None
+    return "question", None
+
+def plan_query(query, current_url, base_url):
+    """Decide how to answer a message: locally, or with an LLM call on the selected page."""
+    intent, arg = classify_intent(query)
+    if current_url and urlparse(current_url).netloc != urlparse(base_url).netloc:
+        # The selected page belongs to a different wiki than the one now entered/selected
+        current_url = None
+    if intent in ("greeting", "farewell", "thanks"):
+        return {"intent": intent, "action": "reply"}
+    if intent == "find":
+        return {"intent": intent, "action": "search", "term": arg}
+    if intent in ("infobox", "list_sections", "list_links"):
+        return {"intent": intent, "action": "extract", "url": current_url or base_url}
+    return {"intent": intent, "action": "generate", "url": current_url or base_url}
+
+LOCAL_REPLIES = {
+    "greeting": "Hello! How can I help you with Fandom wikis today?",
+    "farewell": "Goodbye! If you have more Fandom questions, just ask.",
+    "thanks": "You're welcome! Let me know if you need anything else.",
+}
+
+# --- Token budgets and context packing ---
+# Default prompt context budget (tokens), reply limit, tokenizer estimate and USD price per 1M tokens.
+# Budgets can be overridden per model with "context_budgets" in the config file.
+# chars_per_token is only a starting point (about 4 for English with OpenAI/Gemini, a bit less for Claude);
+# it is recalibrated from the prompt token counts each API reports and kept in "chars_per_token" in the config.
+PROVIDERS = {
+    "GPT-3.5 Turbo": {"context_budget": 12000, "max_tokens": 600, "chars_per_token": 4.0, "input_cost": 0.50, "output_cost": 1.50},
+    "Gemini Pro": {"context_budget": 24000, "max_tokens": 600, "chars_per_token": 4.0, "input_cost": 0.50, "output_cost": 1.50},
+    "Claude 3": {"context_budget": 8000, "max_tokens": 600, "chars_per_token": 3.5, "input_cost": 15.00, "output_cost": 75.00},
+}
+CALIBRATION_WEIGHT = 0.3
+
+_tiktoken_encoding = [None]
+
+def count_tokens(text, model_choice, chars_per_token=None):
+    """Count tokens with tiktoken for OpenAI models if installed, else a per-provider chars-per-token estimate."""
+    if model_choice == "GPT-3.5 Turbo":
+        if _tiktoken_encoding[0] is None:
+            try:
+                import tiktoken
+                _tiktoken_encoding[0] = tiktoken.encoding_for_model("gpt-3.5-turbo")
+            except Exception:
+                _tiktoken_encoding[0] = False
+        if _tiktoken_encoding[0]:
+            return len(_tiktoken_encoding[0].encode(text))
+    return int(len(text) / (chars_per_token or PROVIDERS[model_choice]["chars_per_token"])) + 1
+
+def get_chars_per_token(config, model_choice):
+    try:
+        return float(config.get("chars_per_token", {}).get(model_choice, PROVIDERS[model_choice]["chars_per_token"]))
+    except (TypeError, ValueError, AttributeError):
+        return PROVIDERS[model_choice]["chars_per_token"]
+
+def calibrate_chars_per_token(config, model_choice, prompt_chars, prompt_tokens):
+    """Move the stored chars-per-token estimate towards the ratio observed in an API-reported prompt."""
+    if not prompt_tokens:
+        return
+    observed = prompt_chars / prompt_tokens
+    current = get_chars_per_token(config, model_choice)
+    if not isinstance(config.get("chars_per_token"), dict):
+        config["chars_per_token"] = {}
+    config["chars_per_token"][model_choice] = round((1 - CALIBRATION_WEIGHT) * current + CALIBRATION_WEIGHT * observed, 3)
+
+def _truncate_to_tokens(text, max_tokens, count):
+    """Cut text at a word boundary so that count(text) <= max_tokens."""
+    while text and count(text) > max_tokens:
+        keep = int(len(text) * max_tokens / count(text) * 0.95)
+        text = text[:keep].rsplit(' ', 1)[0] if ' ' in text[:keep] else text[:keep]
+    return text
+
+STOPWORDS = {"the", "and", "for", "are", "was", "were", "has", "have", "had", "its", "it's", "this", "that", "these",
+             "those", "with", "from", "about", "into", "there", "their", "they", "them", "you", "your", "can", "could",
+             "would", "should", "does", "did", "tell", "give", "show", "explain", "describe", "please", "page", "wiki"}
+
+def _query_terms(query):
+    words = re.findall(r"[a-z0-9]+", query.lower())
+    return [w for w in dict.fromkeys(words) if len(w) > 2 and w not in STOPWORDS and w not in QUESTION_WORDS]
+
+def pack_context(parts, query, budget, count):
+    """Fill a token budget with the most useful page content.
+
+    Order: intro (capped at half the budget so matching sections still fit), infobox, sections
+    whose heading or text mentions the query's keywords, then the remaining sections in page
+    order. Paragraphs repeated across the page are dropped. Returns (context_text, context_tokens).
+    """
+    patterns = [re.compile(rf"\b{re.escape(t)}\b") for t in _query_terms(query)]
+    def score(heading, paragraphs):
+        heading_l, body = heading.lower(), " ".join(paragraphs).lower()
+        return sum(3 * len(p.findall(heading_l)) + len(p.findall(body)) for p in patterns)
+    scored = [(score(h, ps), i, h, ps) for i, (h, ps) in enumerate(parts["sections"])]
+    matching = sorted((x for x in scored if x[0] > 0), key=lambda x: (-x[0], x[1]))
+    others = [x for x in scored if x[0] == 0]
+    chunks = []
+    if parts["intro"]:
+        intro = "\n".join(parts["intro"])
+        if parts["sections"]:
+            intro = _truncate_to_tokens(intro, budget // 2, count)
+        chunks.append(intro)
+    if parts["infobox"]:
+        chunks.append("Infobox:\n" + "\n".join(f"- {label}: {value}" for label, value in parts["infobox"]))
+    chunks += [f"== {h} ==\n" + "\n".join(ps) for _, _, h, ps in matching + others]
+
+    seen = set()
+    packed, used = [], 0
+    for chunk in chunks:
+        lines = []
+        heading = None
+        for line in chunk.split("\n"):
+            if heading is None and not lines and line.startswith("== "):
+                # Headings are kept even if repeated ("Trivia", "Gallery"); only body lines are deduplicated
+                heading = line
+                continue
+            key = re.sub(r"\W+", " ", line.lower()).strip()
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            lines.append(line)
+        if not lines:
+            continue
+        if heading:
+            lines.insert(0, heading)
+        chunk = "\n".join(lines)
+        tokens = count(chunk)
+        if used + tokens > budget:
+            remaining = budget - used
+            if remaining < 50:
+                break
+            chunk = _truncate_to_tokens(chunk, remaining, count)
+            tokens = count(chunk)
+        packed.append(chunk)
+        used += tokens
+    return "\n\n".join(packed), used
+
+def get_context_budget(config, model_choice):
+    try:
+        return int(config.get("context_budgets", {}).get(model_choice, PROVIDERS[model_choice]["context_budget"]))
+    except (TypeError, ValueError, AttributeError):
+        return PROVIDERS[model_choice]["context_budget"]
+
+def estimate_cost(model_choice, prompt_tokens, reply_tokens):
+    provider = PROVIDERS[model_choice]
+    return (prompt_tokens * provider["input_cost"] + reply_tokens * provider["output_cost"]) / 1_000_000
+
+def gpt35_turbo_chat(messages, api_key, max_tokens=512):
+    try:
+        import openai
+    except ImportError:
         raise ImportError("openai package not installed. Please install openai.")
     openai.api_key = api_key
     response = openai.ChatCompletion.create(
         model="gpt-3.5-turbo",
         messages=messages,
-        max_tokens=512,
+        max_tokens=max_tokens,
         temperature=0.7
     )
     return response.choices[0].message['content']
@@ -268,177 +566,157 @@ def run_gui():
     def get_fandom_url():
         return url_entry.get().strip() or FANDOMS[fandom_var.get()]
 
-    def openai_chat(messages, api_key):
+    # Each chat function returns (reply, usage) and raises on failure.
+    # usage is {"prompt_tokens", "reply_tokens"} as reported by the API, or None.
+    def openai_chat(messages, api_key, max_tokens=600):
+        import openai
         openai.api_key = api_key
-        try:
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=messages,
-                max_tokens=600,
-                temperature=0.7
-            )
-            return response.choices[0].message['content']
-        except Exception as e:
-            return f"[OpenAI Error] {e}"
-
-    import requests as _requests
-
-    def gemini_chat(messages, api_key):
+        response = openai.ChatCompletion.create(
+            model="gpt-3.5-turbo",
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=0.7
+        )
+        usage = response.get("usage")
+        if usage:
+            usage = {"prompt_tokens": usage["prompt_tokens"], "reply_tokens": usage["completion_tokens"]}
+        return response.choices[0].message['content'], usage
+
+    def gemini_chat(messages, api_key, max_tokens=600):
         # Google Gemini API (generative-language API)
-        try:
-            url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent?key=" + api_key
-            data = {
-                "contents": [{"parts": [{"text": m['content']} for m in messages if m['role'] == 'user']}]
-
-            }
-            resp = _requests.post(url, json=data)
-            if resp.status_code == 200:
-                out = resp.json()
-                return out['candidates'][0]['content']['parts'][0]['text']
-            return f"[Gemini API error: {resp.text}]"
-        except Exception as e:
-            return f"[Gemini API error: {e}]"
-
-    def claude_chat(messages, api_key):
+        import requests as _requests
+        url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent?key=" + api_key
+        data = {
+            "contents": [{"parts": [{"text": m['content']} for m in messages if m['role'] == 'user']}],
+            "generationConfig": {"maxOutputTokens": max_tokens}
+        }
+        resp = _requests.post(url, json=data)
+        if resp.status_code != 200:
+            raise RuntimeError(f"Gemini API error: {resp.text}")
+        out = resp.json()
+        meta = out.get('usageMetadata')
+        usage = {"prompt_tokens": meta.get('promptTokenCount', 0), "reply_tokens": meta.get('candidatesTokenCount', 0)} if meta else None
+        return out['candidates'][0]['content']['parts'][0]['text'], usage
+
+    def claude_chat(messages, api_key, max_tokens=600):
         # Anthropic Claude API (v2023-06-01)
-        try:
-            url = "https://api.anthropic.com/v1/messages"
-            headers = {
-                "x-api-key": api_key,
-                "anthropic-version": "2023-06-01",
-                "content-type": "application/json"
-            }
-            prompt = "\n\n".join([m['content'] for m in messages if m['role'] == 'user'])
-            data = {
-                "model": "claude-3-opus-20240229",
-                "max_tokens": 600,
-                "messages": [{"role": "user", "content": prompt}]
-            }
-            resp = _requests.post(url, headers=headers, json=data)
-            if resp.status_code == 200:
-                out = resp.json()
-                return out['content'][0]['text']
-            return f"[Claude API error: {resp.text}]"
-        except Exception as e:
-            return f"[Claude API error: {e}]"
+        import requests as _requests
+        url = "https://api.anthropic.com/v1/messages"
+        headers = {
+            "x-api-key": api_key,
+            "anthropic-version": "2023-06-01",
+            "content-type": "application/json"
+        }
+        prompt = "\n\n".join([m['content'] for m in messages if m['role'] == 'user'])
+        data = {
+            "model": "claude-3-opus-20240229",
+            "max_tokens": max_tokens,
+            "messages": [{"role": "user", "content": prompt}]
+        }
+        resp = _requests.post(url, headers=headers, json=data)
+        if resp.status_code != 200:
+            raise RuntimeError(f"Claude API error: {resp.text}")
+        out = resp.json()
+        meta = out.get('usage')
+        usage = {"prompt_tokens": meta.get('input_tokens', 0), "reply_tokens": meta.get('output_tokens', 0)} if meta else None
+        return out['content'][0]['text'], usage
+
+    # Page HTML cache (least recently used pages are dropped) and the page currently selected
+    # in the sidebar (or found by search). Text and packed context are both built from the cached HTML.
+    html_cache = OrderedDict()
+    current_page = [None]
+
+    def get_page_html(url):
+        if url in html_cache:
+            html_cache.move_to_end(url)
+            return html_cache[url]
+        html = fetch_page_html(url)
+        if not html:
+            return None
+        html_cache[url] = html
+        if len(html_cache) > PAGE_CACHE_SIZE:
+            html_cache.popitem(last=False)
+        return html
+
+    def get_page_text(url):
+        html = get_page_html(url)
+        return page_text_from_html(html) if html else None
+
+    def get_page_parts(url):
+        html = get_page_html(url)
+        return page_parts_from_html(html, url) if html else None
 
     def handle_natural_language(query, base_url, model_choice, api_key):
         print_chat("You", query)
-        q = query.lower().strip()
-        # --- Conversational intent detection ---
-        greetings = ["hi", "hello", "hey", "good morning", "good afternoon", "good evening"]
-        farewells = ["bye", "goodbye", "see you", "later", "cya"]
-        thanks = ["thanks", "thank you", "thx", "appreciate it"]
-        if any(g in q for g in greetings):
-            if model_choice == "GPT-3.5 Turbo" and api_key:
-                messages = [
-                    {"role": "system", "content": "You are a friendly Fandom wiki assistant who can also chat casually."},
-                    {"role": "user", "content": query}
-                ]
-                answer = openai_chat(messages, api_key)
-                print_chat("ChatGPT", answer)
-            else:
-                print_chat("AI", "Hello! How can I help you with Fandom wikis today?")
+        plan = plan_query(query, current_page[0], base_url)
+        # --- Answered locally, no API call ---
+        if plan["action"] == "reply":
+            print_chat("AI", LOCAL_REPLIES[plan["intent"]])
             return
-        if any(f in q for f in farewells):
-            if model_choice == "GPT-3.5 Turbo" and api_key:
-                messages = [
-                    {"role": "system", "content": "You are a friendly Fandom wiki assistant who can also chat casually."},
-                    {"role": "user", "content": query}
-                ]
-                answer = openai_chat(messages, api_key)
-                print_chat("ChatGPT", answer)
+        if plan["action"] == "search":
+            search_term = plan["term"]
+            print_chat("System", f"Searching all pages for '{search_term}'...")
+            # Pages scanned by a search are not cached: a search reads the whole wiki
+            best_url, best_text = find_best_page(base_url, search_term)
+            if best_url:
+                current_page[0] = best_url
+                print_chat("AI", f"Best match: {best_url}\nPreview: {best_text[:500]}...\n(Page selected. You can now ask questions about this page.)")
             else:
-                print_chat("AI", "Goodbye! If you have more Fandom questions, just ask.")
+                print_chat("AI", "No relevant article found.")
             return
-        if any(t in q for t in thanks):
-            if model_choice == "GPT-3.5 Turbo" and api_key:
-                messages = [
-                    {"role": "system", "content": "You are a friendly Fandom wiki assistant who can also chat casually."},
-                    {"role": "user", "content": query}
-                ]
-                answer = openai_chat(messages, api_key)
-                print_chat("ChatGPT", answer)
+        if plan["action"] == "extract":
+            html = get_page_html(plan["url"])
+            if not html:
+                print_chat("AI", "Failed to load the page for this Fandom.")
+                return
+            if plan["intent"] == "infobox":
+                rows = infobox_rows_from_html(html)
+                if rows is None:
+                    print_chat("AI", "No infobox found on this page.")
+                else:
+                    print_chat("AI", "Infobox data:\n" + "\n".join(f"- {label}: {value}" for label, value in rows))
+            elif plan["intent"] == "list_sections":
+                sections = page_sections_from_html(html)
+                print_chat("AI", "Sections on this page:\n" + "\n".join(f"- {h}" for h in sections) if sections else "No sections found on this page.")
             else:
-                print_chat("AI", "You're welcome! Let me know if you need anything else.")
+                links = page_links_from_html(html)
+                print_chat("AI", "Links on this page:\n" + "\n".join(f"- {href}" for href in links) if links else "No links found on this page.")
             return
-        # --- Fandom Q&A and search logic ---
-        if model_choice == "GPT-3.5 Turbo" and api_key:
-            # For full Fandom access, scan all pages for best match if needed
-            if 'find' in q or 'page' in q:
-                match = re.search(r'find (the )?(?P<term>.+?) page', query, re.IGNORECASE)
-                if match:
-                    search_term = match.group('term').strip()
-                    print_chat("System", f"Searching all pages for '{search_term}'...")
-                    try:
-                        pages = get_all_fandom_pages(base_url)
-                        best_url, best_text = None, None
-                        best_score = 0
-                        for page_url in pages:
-                            try:
-                                text = fetch_fandom_page(page_url)
-                                if not text:
-                                    continue
-                                score = text.lower().count(search_term.lower())
-                                if score > best_score:
-                                    best_score = score
-                                    best_url = page_url
-                                    best_text = text[:2000]
-                            except Exception:
-                                continue
-                        if best_url:
-                            prompt = f"You are an expert on Fandom wikis. The user asked: '{query}'. Here is the best matching page content from {best_url}:\n{best_text}\nPlease answer the user's request as helpfully as possible."
-                            messages = [
-                                {"role": "system", "content": "You are a helpful assistant for Fandom wikis."},
-                                {"role": "user", "content": prompt}
-                            ]
-                            answer = openai_chat(messages, api_key)
-                            print_chat("ChatGPT", answer)
-                        else:
-                            print_chat("ChatGPT", "No relevant article found.")
-                    except Exception as e:
-                        print_chat("ChatGPT", f"[OpenAI error: {e}]")
-                    return
-            # For other queries, just fetch main page and send to GPT-3.5
-            try:
-                text = fetch_fandom_page(base_url)
-                if not text:
-                    print_chat("ChatGPT", "Failed to load the main page for this Fandom.")
-                    return
-                prompt = f"You are an expert on Fandom wikis. The user asked: '{query}'. Here is the main page content:\n{text[:2000]}\nPlease answer the user's request as helpfully as possible."
-                messages = [
-                    {"role": "system", "content": "You are a helpful assistant for Fandom wikis."},
-                    {"role": "user", "content": prompt}
-                ]
-                answer = openai_chat(messages, api_key)
-                print_chat("ChatGPT", answer)
-            except Exception as e:
-                print_chat("ChatGPT", f"[OpenAI error: {e}]")
+        # --- Generation needed: call the selected model with the selected page as context ---
+        if not api_key:
+            print_chat("System", "API key required. Please enter your key or buy access.")
             return
-        elif model_choice == "Gemini Pro" and api_key:
-            try:
-                text = fetch_fandom_page(base_url)
-                prompt = f"You are an expert on Fandom wikis. The user asked: '{query}'. Here is the main page content:\n{text[:2000]}\nPlease answer the user's request as helpfully as possible."
-                messages = [
-                    {"role": "user", "content": prompt}
-                ]
-                answer = gemini_chat(messages, api_key)
-                print_chat("Gemini", answer)
-            except Exception as e:
-                print_chat("Gemini", f"[Gemini error: {e}]")
+        chat_fns = {"GPT-3.5 Turbo": ("ChatGPT", openai_chat), "Gemini Pro": ("Gemini", gemini_chat), "Claude 3": ("Claude", claude_chat)}
+        if model_choice not in chat_fns:
             return
-        elif model_choice == "Claude 3" and api_key:
-            try:
-                text = fetch_fandom_page(base_url)
-                prompt = f"You are an expert on Fandom wikis. The user asked: '{query}'. Here is the main page content:\n{text[:2000]}\nPlease answer the user's request as helpfully as possible."
-                messages = [
-                    {"role": "user", "content": prompt}
-                ]
-                answer = claude_chat(messages, api_key)
-                print_chat("Claude", answer)
-            except Exception as e:
-                print_chat("Claude", f"[Claude error: {e}]")
+        name, chat_fn = chat_fns[model_choice]
+        chars_per_token = get_chars_per_token(config, model_choice)
+        count = lambda t: count_tokens(t, model_choice, chars_per_token)
+        max_tokens = PROVIDERS[model_choice]["max_tokens"]
+        budget = get_context_budget(config, model_choice)
+        try:
+            parts = get_page_parts(plan["url"])
+            if not parts:
+                print_chat(name, "Failed to load the page for this Fandom.")
+                return
+            context, context_tokens = pack_context(parts, query, budget, count)
+            prompt = f"You are an expert on Fandom wikis. The user asked: '{query}'. Here is the relevant page content from {plan['url']}:\n{context}\nPlease answer the user's request as helpfully as possible."
+            messages = [{"role": "user", "content": prompt}]
+            if model_choice == "GPT-3.5 Turbo":
+                messages.insert(0, {"role": "system", "content": "You are a helpful assistant for Fandom wikis."})
+            answer, usage = chat_fn(messages, api_key, max_tokens=max_tokens)
+        except Exception as e:
+            print_chat(name, f"[{name} error: {e}]")
             return
+        print_chat(name, answer)
+        if usage:
+            prompt_tokens, reply_tokens, source = usage["prompt_tokens"], usage["reply_tokens"], "reported by API"
+            calibrate_chars_per_token(config, model_choice, sum(len(m["content"]) for m in messages), prompt_tokens)
+            save_config(config)
+        else:
+            prompt_tokens, reply_tokens, source = sum(count(m["content"]) for m in messages), count(answer), "estimated"
+        cost = estimate_cost(model_choice, prompt_tokens, reply_tokens)
+        print_chat("System", f"Prompt: {prompt_tokens} tokens ({context_tokens}/{budget} context budget), reply: {reply_tokens} tokens ({source}), cost ${cost:.4f}")
 
     # --- Page browser logic ---
     def load_page_list():
@@ -465,8 +743,9 @@ def run_gui():
         page_url = root_url + "/wiki/" + title.replace(" ", "_")
         set_loading(f"Loading page: {title} ...")
         try:
-            text = fetch_fandom_page(page_url)
+            text = get_page_text(page_url)
             if text:
+                current_page[0] = page_url
                 print_chat("[Page Loaded]", f"{title}\n{text[:1000]}...\n(Page loaded. You can now ask questions about this page.)")
             else:
                 print_chat("[Error]", f"Could not load page: {title}")
@@ -501,9 +780,6 @@ def run_gui():
             api_key = claude_key_var.get().strip()
         else:
             api_key = ""
-        if not api_key:
-            print_chat("System", "API key required. Please enter your key or buy access.")
-            return
         set_loading("Thinking...")
         def run_query():
             try:
@@ -519,10 +795,24 @@ def run_gui():
 
     # Auto-load page list on fandom change
     def on_fandom_change(event=None):
+        current_page[0] = None
         threading.Thread(target=load_page_list).start()
     fandom_menu.bind('<<ComboboxSelected>>', on_fandom_change)
 
-    root.after(100, load_page_list)
+    # Launch-time probe for measure_startup.py: record when the window is mapped, then quit
+    probe_path = os.environ.get("FANDOMAI_STARTUP_PROBE")
+    if probe_path:
+        def on_first_map(event=None):
+            # Child widgets share the root's bindtag; only the toplevel window being mapped counts
+            if event is not None and event.widget is not root:
+                return
+            root.unbind('<Map>')
+            with open(probe_path, "w", encoding="utf-8") as f:
+                f.write(repr(time.time()))
+            root.after(0, root.destroy)
+        root.bind('<Map>', on_first_map)
+    else:
+        root.after(100, load_page_list)
     chat_entry.focus_set()
     root.mainloop()
 
@@ -0,0 +1,102 @@
+import subprocess
+import sys
+import os
+import time
+import tempfile
+import statistics
+import argparse
+
+# Measures how long FandomAI takes from process start until its window is shown.
+# The app writes a timestamp to $FANDOMAI_STARTUP_PROBE when the window is mapped, then exits.
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def default_target():
+    """Prefer the onedir build, then the onefile build, then the plain script."""
+    exe = "FandomAI.exe" if sys.platform == "win32" else "FandomAI"
+    for path in (os.path.join(HERE, "dist", "FandomAI", exe), os.path.join(HERE, "dist", exe)):
+        if os.path.exists(path):
+            return [path]
+    return [sys.executable, os.path.join(HERE, "fandom_ai_gui.py")]
+
+def drop_file_cache():
+    """Clear the OS file cache so the next launch is really cold. Needs root/sudo; returns True on success."""
+    if sys.platform.startswith("linux"):
+        cmd = ["sh", "-c", "sync && echo 3 > /proc/sys/vm/drop_caches"]
+    elif sys.platform == "darwin":
+        cmd = ["purge"]
+    else:
+        # Windows has no built-in command for this; reboot before measuring for a cold run
+        return False
+    if hasattr(os, "geteuid") and os.geteuid() != 0:
+        cmd = ["sudo", "-n"] + cmd
+    try:
+        return subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+    except OSError:
+        return False
+
+def time_launch(cmd, timeout=60):
+    """Return (seconds, None) for a launch that showed its window, or (None, reason) if it did not."""
+    fd, probe_path = tempfile.mkstemp(suffix=".txt")
+    os.close(fd)
+    os.remove(probe_path)
+    env = dict(os.environ, FANDOMAI_STARTUP_PROBE=probe_path)
+    start = time.time()
+    try:
+        subprocess.run(cmd, env=env, timeout=timeout, check=False)
+        with open(probe_path, "r", encoding="utf-8") as f:
+            return float(f.read()) - start, None
+    except subprocess.TimeoutExpired:
+        return None, "timed out"
+    except (OSError, ValueError):
+        return None, "launch failed"
+    finally:
+        if os.path.exists(probe_path):
+            os.remove(probe_path)
+
+def measure(cmd, runs=5, cold=False):
+    """Launch cmd runs times. With cold=True the OS file cache is cleared before the first launch."""
+    cache_cleared = drop_file_cache() if cold else False
+    results = [time_launch(cmd) for _ in range(runs)]
+    return {"first": results[0], "warm": results[1:], "cache_cleared": cache_cleared, "cold_requested": cold}
+
+def _ms(result):
+    seconds, error = result
+    return error if error else f"{seconds * 1000:.0f} ms"
+
+def format_report(cmd, result):
+    if result["cache_cleared"]:
+        first_label = "Cold launch (OS file cache cleared)"
+    elif result["cold_requested"]:
+        first_label = "First run (could not clear the OS file cache, so this may be warm)"
+    else:
+        first_label = "First run (files may still be in the OS file cache)"
+    lines = [
+        "FandomAI launch-time report",
+        f"Target: {' '.join(cmd)}",
+        f"{first_label}: {_ms(result['first'])}",
+    ]
+    warm = [seconds for seconds, error in result["warm"] if error is None]
+    failed = [error for seconds, error in result["warm"] if error is not None]
+    if warm:
+        lines.append(f"Warm launch ({len(warm)} runs): median {statistics.median(warm) * 1000:.0f} ms, "
+                     f"min {min(warm) * 1000:.0f} ms, max {max(warm) * 1000:.0f} ms")
+    if failed:
+        lines.append(f"Warm launch failures: {len(failed)} ({', '.join(sorted(set(failed)))})")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure FandomAI cold and warm launch time.")
+    parser.add_argument("target", nargs="*", help="command to launch (default: dist/FandomAI build or fandom_ai_gui.py)")
+    parser.add_argument("--runs", type=int, default=5, help="number of launches, the first one is reported separately")
+    parser.add_argument("--cold", action="store_true", help="clear the OS file cache before the first launch (needs root/sudo)")
+    parser.add_argument("--output", help="also write the report to this file")
+    args = parser.parse_args()
+    cmd = args.target or default_target()
+    report = format_report(cmd, measure(cmd, max(args.runs, 1), cold=args.cold))
+    print(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+
+if __name__ == "__main__":
+    main()